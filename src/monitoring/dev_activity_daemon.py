@@ -8,11 +8,16 @@ import os
 import sys
 import time
 import json
+import struct
+import signal
+import hashlib
 import psutil
 import subprocess
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from dev_idle_policy import IdlePolicy, IdleTimer, reading_is_active
 
 # Configuration (loaded from environment or defaults)
 DEV_USER = os.getenv('DEV_USER', 'jerry')
@@ -21,13 +26,26 @@ ACTIVITY_LOG_DIR = os.getenv('ACTIVITY_LOG_DIR', '/var/log/dev-activity')
 CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL_SECONDS', '5')) # Check every 5 seconds
 IDLE_SHUTDOWN_MINUTES = int(os.getenv('IDLE_SHUTDOWN_MINUTES', '30'))
 CPU_IDLE_THRESHOLD = float(os.getenv('CPU_IDLE_THRESHOLD', '5.0'))
+GIT_REPO_RESCAN_SECONDS = int(os.getenv('GIT_REPO_RESCAN_SECONDS', '300'))
+RECORD_PROBE_READINGS = os.getenv('RECORD_PROBE_READINGS', 'false').lower() == 'true'
+
+# Idle policy (shared with dev_idle_replay.py for offline tuning)
+IDLE_POLICY = IdlePolicy(
+    idle_shutdown_minutes=IDLE_SHUTDOWN_MINUTES,
+    cpu_idle_threshold=CPU_IDLE_THRESHOLD,
+    x11_idle_seconds=CHECK_INTERVAL
+)
 
 # Global state
 last_activity_time = time.time()
 last_net_io = psutil.net_io_counters() # Initialize net stats
 activity_log_file = Path(ACTIVITY_LOG_DIR) / f'{DEV_USER}_activity.jsonl'
 keystroke_log_file = Path(ACTIVITY_LOG_DIR) / 'keystrokes' / f'{DEV_USER}_keystrokes.log'
+readings_log_dir = Path(ACTIVITY_LOG_DIR) / 'readings'
 last_keystroke_count = 0
+git_repos: Dict[str, str] = {}  # git dir -> repo path relative to PROJECTS_ROOT
+git_repo_state: Dict[str, Dict] = {}  # git dir -> last file snapshot and index digest
+git_last_repo_scan = 0.0
 
 
 def log_activity(event_type: str, details: Dict) -> None:
@@ -48,6 +66,30 @@ def log_activity(event_type: str, details: Dict) -> None:
         print(f"Error logging activity: {e}", file=sys.stderr)
 
 
+def record_reading(event_type: str, details: Dict) -> None:
+    """Record a raw probe reading (active or idle) for offline policy replay"""
+    if not RECORD_PROBE_READINGS:
+        return
+    
+    try:
+        readings_log_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Daily file so weeks of readings can be archived/replayed in chunks
+        readings_file = readings_log_dir / f'{DEV_USER}_readings_{datetime.utcnow().strftime("%Y-%m-%d")}.jsonl'
+        
+        event = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'user': DEV_USER,
+            'event_type': event_type,
+            'details': details
+        }
+        
+        with open(readings_file, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+    except Exception as e:
+        print(f"Error recording probe reading: {e}", file=sys.stderr)
+
+
 def get_keystroke_count() -> int:
     """Get approximate keystroke count from input device events"""
     try:
@@ -167,23 +209,303 @@ def get_modified_files(since_time: float) -> List[str]:
     return modified_files
 
 
-def check_git_activity() -> Dict:
-    """Check for recent git commits"""
+def resolve_git_dir(repo_path: str) -> Optional[str]:
+    """Resolve the git directory for a work tree (handles worktree/submodule .git files)"""
+    dot_git = os.path.join(repo_path, '.git')
+    if os.path.isdir(dot_git):
+        return dot_git
     try:
-        result = subprocess.run(
-            ['git', '-C', PROJECTS_ROOT, 'log', '--all', '--since=1 hour ago', '--oneline'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
+        with open(dot_git, 'r') as f:
+            line = f.readline().strip()
+        if line.startswith('gitdir:'):
+            git_dir = os.path.join(repo_path, line[len('gitdir:'):].strip())
+            if os.path.isdir(git_dir):
+                return os.path.normpath(git_dir)
+    except OSError:
+        pass
+    return None
+
+
+def discover_git_repos() -> Dict[str, str]:
+    """Find all git repositories under PROJECTS_ROOT, mapping git dir -> repo path"""
+    repos = {}
+    
+    if not os.path.exists(PROJECTS_ROOT):
+        return repos
+    
+    try:
+        for root, dirs, files in os.walk(PROJECTS_ROOT):
+            if '.git' in dirs or '.git' in files:
+                git_dir = resolve_git_dir(root)
+                if git_dir:
+                    repos[os.path.realpath(git_dir)] = os.path.relpath(root, PROJECTS_ROOT)
+            
+            # Skip hidden directories and .git (nested repos are still found)
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+    except Exception as e:
+        print(f"Error discovering git repositories: {e}", file=sys.stderr)
+    
+    return repos
+
+
+def snapshot_git_files(git_dir: str) -> Dict[str, tuple]:
+    """Stat the ref, reflog and index files of a git dir, mapping path -> (role, signature)"""
+    snapshot = {}
+    
+    # Linked worktrees keep HEAD/index/logs locally but share refs with the main repo
+    ref_dirs = [git_dir]
+    try:
+        with open(os.path.join(git_dir, 'commondir'), 'r') as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+            ref_dirs.append(common_dir)
+    except OSError:
+        pass
+    
+    def add(path: str, role: str) -> None:
+        try:
+            st = os.stat(path)
+            snapshot[path] = (role, (st.st_mtime_ns, st.st_size, st.st_ino))
+        except OSError:
+            pass
+    
+    def add_tree(top: str, role: str) -> None:
+        for root, _, files in os.walk(top):
+            for name in files:
+                if not name.endswith('.lock'):
+                    add(os.path.join(root, name), role)
+    
+    add(os.path.join(git_dir, 'HEAD'), 'head')
+    add(os.path.join(git_dir, 'index'), 'index')
+    add(os.path.join(git_dir, 'ORIG_HEAD'), 'ref')
+    add(os.path.join(git_dir, 'FETCH_HEAD'), 'fetch')
+    add_tree(os.path.join(git_dir, 'logs'), 'reflog')
+    
+    for ref_dir in ref_dirs:
+        add(os.path.join(ref_dir, 'packed-refs'), 'packed')
+        add_tree(os.path.join(ref_dir, 'refs'), 'ref')
+        if ref_dir != git_dir:
+            add(os.path.join(ref_dir, 'FETCH_HEAD'), 'fetch')
+            add_tree(os.path.join(ref_dir, 'logs', 'refs'), 'reflog')
+    
+    return snapshot
+
+
+def classify_reflog_message(message: str) -> str:
+    """Map a reflog message (e.g. 'commit (amend): ...') to an activity kind"""
+    if message.startswith('update by push'):
+        return 'push'
+    
+    action = message.split(':', 1)[0].strip().split(' ', 1)[0].lower()
+    aliases = {
+        'switch': 'checkout',
+        'pull': 'fetch',
+        'cherry-pick': 'commit',
+        'revert': 'commit',
+        'wip': 'stash',  # "WIP on <branch>: ..."
+        'on': 'stash',   # "On <branch>: <message>" (git stash push -m)
+    }
+    return aliases.get(action, action or 'ref_update')
+
+
+def read_reflog_kinds(path: str, offset: int) -> Dict[str, int]:
+    """Classify reflog entries appended to a reflog file after a byte offset"""
+    kinds = {}
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except OSError:
+        return kinds
+    
+    # Each line is "<old> <new> <ident> <time> <tz>\t<message>"
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        if '\t' not in line:
+            continue
+        kind = classify_reflog_message(line.split('\t', 1)[1])
+        kinds[kind] = kinds.get(kind, 0) + 1
+    
+    return kinds
+
+
+def read_index_digest(index_path: str) -> Optional[str]:
+    """
+    Hash the staged content of a git index, ignoring cached stat data.
+    `git status` (IDEs, prompts, cron jobs) rewrites the index to refresh stat
+    info; only a change in mode/object/path means something was staged.
+    """
+    try:
+        with open(index_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    
+    if len(data) < 12 or data[:4] != b'DIRC':
+        return None
+    
+    version, count = struct.unpack('>II', data[4:12])
+    if version not in (2, 3):
+        # v4 prefix-compresses paths; fall back to treating any rewrite as staging
+        return hashlib.sha1(data).hexdigest()
+    
+    digest = hashlib.sha1()
+    offset = 12
+    try:
+        for _ in range(count):
+            # 40 bytes of stat data, 20 byte object id, 2 byte flags
+            flags = struct.unpack('>H', data[offset + 60:offset + 62])[0]
+            header_len = 64 if version == 3 and flags & 0x4000 else 62
+            path_end = data.index(b'\0', offset + header_len)
+            digest.update(data[offset + 24:offset + 28])  # mode
+            digest.update(data[offset + 40:offset + 62])  # object id + flags
+            digest.update(data[offset + header_len:path_end + 1])
+            offset += (path_end - offset + 8) // 8 * 8
+    except (struct.error, ValueError):
+        return hashlib.sha1(data).hexdigest()
+    
+    return digest.hexdigest()
+
+
+def read_packed_refs(path: str) -> Dict[str, str]:
+    """Read a packed-refs file into ref name -> object id"""
+    refs = {}
+    try:
+        with open(path, 'r', errors='replace') as f:
+            for line in f:
+                # Skip the "# pack-refs with:" header and "^<oid>" peeled tag lines
+                if line.startswith(('#', '^')):
+                    continue
+                parts = line.split()
+                if len(parts) == 2:
+                    refs[parts[1]] = parts[0]
+    except OSError:
+        pass
+    return refs
+
+
+def packed_ref_changes(current: Dict, previous: Dict, state: Dict) -> bool:
+    """
+    Check loose ref deletions and packed-refs rewrites for real ref changes.
+    `git gc`, `git pack-refs` and scheduled `git maintenance` move loose refs
+    into packed-refs unchanged; that is housekeeping, not user activity.
+    """
+    old_packed = state.get('packed', {})
+    packed = {}
+    for path, (role, sig) in current.items():
+        if role != 'packed':
+            continue
+        old = previous.get(path)
+        if old is not None and old[1] == sig and path in old_packed:
+            packed[path] = old_packed[path]
+        else:
+            packed[path] = read_packed_refs(path)
+    state['packed'] = packed
+    
+    removed = [path for path, (role, _) in previous.items() if role == 'ref' and path not in current]
+    packed_now = set()
+    
+    # Deleted loose refs (e.g. branch -D) show up only as a missing file
+    for path in removed:
+        for packed_path, refs in packed.items():
+            name = os.path.relpath(path, os.path.dirname(packed_path)).replace(os.sep, '/')
+            if name in refs:
+                packed_now.add((packed_path, name))
+                break
+        else:
+            return True
+    
+    for packed_path, refs in packed.items():
+        old_refs = old_packed.get(packed_path, {})
+        for name in set(refs) | set(old_refs):
+            if refs.get(name) != old_refs.get(name) and (packed_path, name) not in packed_now:
+                return True
+    
+    return False
+
+
+def scan_git_dir(git_dir: str, state: Dict) -> Dict[str, int]:
+    """Compare a git dir against its previous snapshot and return activity kinds -> count"""
+    current = snapshot_git_files(git_dir)
+    previous = state.get('files')
+    state['files'] = current
+    
+    if previous is None:
+        # First sighting - record a baseline only
+        state['index'] = read_index_digest(os.path.join(git_dir, 'index'))
+        packed_ref_changes(current, {}, state)
+        return {}
+    
+    reflog_kinds = {}
+    changed_roles = set()
+    
+    for path, (role, sig) in current.items():
+        old = previous.get(path)
+        if old is not None and old[1] == sig:
+            continue
+        changed_roles.add(role)
         
-        commits = result.stdout.strip().split('\n') if result.stdout.strip() else []
-        return {
-            'recent_commits': len(commits),
-            'has_activity': len(commits) > 0
-        }
-    except Exception:
-        return {'recent_commits': 0, 'has_activity': False}
+        if role == 'reflog':
+            old_size = old[1][1] if old is not None else 0
+            if sig[1] < old_size:
+                continue  # Reflog expired/rewritten (gc), not user activity
+            for kind, count in read_reflog_kinds(path, old_size).items():
+                # The same commit lands in logs/HEAD and the branch reflog
+                reflog_kinds[kind] = max(reflog_kinds.get(kind, 0), count)
+    
+    if 'packed' in changed_roles or any(path not in current for path in previous):
+        if packed_ref_changes(current, previous, state):
+            changed_roles.add('ref')
+    
+    kinds = dict(reflog_kinds)
+    
+    if 'index' in changed_roles:
+        digest = read_index_digest(os.path.join(git_dir, 'index'))
+        if digest != state.get('index'):
+            kinds['stage'] = 1
+        state['index'] = digest
+    
+    if 'fetch' in changed_roles:
+        kinds.setdefault('fetch', 1)
+    
+    # Fall back to plain ref changes when reflogs are disabled or silent
+    if not reflog_kinds:
+        if 'head' in changed_roles:
+            kinds['checkout'] = 1
+        elif 'ref' in changed_roles:
+            kinds['ref_update'] = 1
+    
+    return kinds
+
+
+def check_git_activity() -> Dict:
+    """
+    Check for git activity (commits, checkouts, staging, fetches) in all repos
+    by watching ref, reflog and index files - no git subprocesses per cycle
+    """
+    global git_repos, git_last_repo_scan
+    
+    now = time.time()
+    if now - git_last_repo_scan >= GIT_REPO_RESCAN_SECONDS:
+        git_repos = discover_git_repos()
+        git_last_repo_scan = now
+        for git_dir in list(git_repo_state):
+            if git_dir not in git_repos:
+                del git_repo_state[git_dir]
+    
+    events = []
+    for git_dir, repo in git_repos.items():
+        try:
+            kinds = scan_git_dir(git_dir, git_repo_state.setdefault(git_dir, {}))
+        except Exception as e:
+            print(f"Error checking git activity in {repo}: {e}", file=sys.stderr)
+            continue
+        for kind, count in sorted(kinds.items()):
+            events.append({'repo': repo, 'kind': kind, 'count': count})
+    
+    return {
+        'repos_watched': len(git_repos),
+        'events': events,
+        'has_activity': len(events) > 0
+    }
 
 
 def get_x11_idle_time() -> int:
@@ -253,14 +575,13 @@ def is_system_active() -> tuple[bool, Dict]:
     details['modified_files'] = len(modified_files)
     details['files'] = modified_files[:10]  # First 10 files
     
+    # Check for git commits/checkouts/staging/fetches (in last interval)
+    git_activity = check_git_activity()
+    details['git_repos_watched'] = git_activity['repos_watched']
+    details['git_events'] = git_activity['events']
+    
     # Determine if active
-    is_active = (
-        cpu_usage > CPU_IDLE_THRESHOLD or
-        ssh_sessions > 0 or
-        len(modified_files) > 0 or
-        len(details['active_processes']) > 0 or
-        details['user_active_physically']
-    )
+    is_active = reading_is_active(IDLE_POLICY, details)
     
     return is_active, details
 
@@ -396,6 +717,15 @@ def trigger_shutdown() -> None:
         print(f"Error triggering shutdown: {e}", file=sys.stderr)
 
 
+def handle_sigterm(signum, frame) -> None:
+    """Log a clean stop when systemd stops the daemon, then exit"""
+    print("\nStop requested by systemd")
+    stop_details = {'reason': 'sigterm'}
+    log_activity('daemon_stop', stop_details)
+    record_reading('daemon_stop', stop_details)
+    sys.exit(0)
+
+
 def main():
     """Main daemon loop"""
     global last_activity_time
@@ -408,42 +738,49 @@ def main():
     print(f"Log file: {activity_log_file}")
     print("")
     
-    log_activity('daemon_start', {
+    start_details = {
         'check_interval': CHECK_INTERVAL,
-        'idle_shutdown_minutes': IDLE_SHUTDOWN_MINUTES
-    })
+        'idle_shutdown_minutes': IDLE_SHUTDOWN_MINUTES,
+        'cpu_idle_threshold': CPU_IDLE_THRESHOLD
+    }
+    log_activity('daemon_start', start_details)
+    record_reading('daemon_start', start_details)
     
-    consecutive_idle_checks = 0
-    max_idle_checks = (IDLE_SHUTDOWN_MINUTES * 60) // CHECK_INTERVAL
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    # Monotonic clock: a suspend/resume or NTP step must not count as idle time
+    idle_timer = IdleTimer(IDLE_POLICY, time.monotonic())
     
     while True:
         try:
             is_active, details = is_system_active()
+            record_reading('probe_reading', dict(details, is_active=is_active))
+            now = time.monotonic()
+            should_shutdown = idle_timer.observe(now, is_active)
             
             if is_active:
                 # System is active
                 last_activity_time = time.time()
-                consecutive_idle_checks = 0
                 
                 log_activity('activity_detected', details)
                 take_screenshot()
                 print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Active - "
                       f"CPU: {details['cpu_usage']:.1f}%, "
                       f"Processes: {details['process_count']}, "
-                      f"Modified files: {details['modified_files']}")
+                      f"Modified files: {details['modified_files']}, "
+                      f"Git events: {len(details['git_events'])}")
             else:
                 # System is idle
-                consecutive_idle_checks += 1
-                idle_minutes = (consecutive_idle_checks * CHECK_INTERVAL) / 60
+                idle_minutes = idle_timer.idle_seconds(now) / 60
                 
                 print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Idle - "
                       f"{idle_minutes:.1f}/{IDLE_SHUTDOWN_MINUTES} minutes")
                 
                 # Check if we should shut down
-                if consecutive_idle_checks >= max_idle_checks:
+                if should_shutdown:
                     print(f"\n{'='*50}")
                     print(f"IDLE THRESHOLD REACHED: {IDLE_SHUTDOWN_MINUTES} minutes")
                     print(f"{'='*50}\n")
+                    record_reading('auto_shutdown', {'idle_minutes': IDLE_SHUTDOWN_MINUTES})
                     trigger_shutdown()
                     break
             
@@ -452,7 +789,9 @@ def main():
             
         except KeyboardInterrupt:
             print("\nShutdown requested by user")
-            log_activity('daemon_stop', {'reason': 'user_interrupt'})
+            stop_details = {'reason': 'user_interrupt'}
+            log_activity('daemon_stop', stop_details)
+            record_reading('daemon_stop', stop_details)
             break
         except Exception as e:
             print(f"Error in main loop: {e}", file=sys.stderr)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Idle Shutdown Policy
+Activity rules and idle timer shared by the activity daemon and the replay engine
+"""
+
+from dataclasses import dataclass, fields, replace
+from typing import Dict, Optional, Union, get_args, get_origin
+
+
+@dataclass(frozen=True)
+class IdlePolicy:
+    """Tunable knobs deciding whether a probe reading counts as activity"""
+    name: str = 'default'
+    idle_shutdown_minutes: float = 30.0
+    cpu_idle_threshold: float = 5.0
+    x11_idle_seconds: float = 60.0      # Input within this window = physically active
+    count_ssh_sessions: bool = True
+    count_modified_files: bool = True
+    count_git_events: bool = True
+    count_active_processes: bool = True
+    count_keyboard: bool = False
+    net_bytes_threshold: Optional[int] = None  # None = network traffic ignored
+
+
+TRUE_STRINGS = ('1', 'true', 'yes', 'on')
+FALSE_STRINGS = ('0', 'false', 'no', 'off')
+NONE_STRINGS = ('none', 'null', '')
+
+
+def coerce_setting(key: str, value, field_type):
+    """Convert a (possibly string) value to a policy field's type, raising ValueError if it can't be"""
+    optional = get_origin(field_type) is Union and type(None) in get_args(field_type)
+    if optional:
+        field_type = next(t for t in get_args(field_type) if t is not type(None))
+
+    if value is None or (isinstance(value, str) and value.strip().lower() in NONE_STRINGS
+                         and field_type is not str):
+        if optional:
+            return None
+        raise ValueError(f"Policy setting {key} cannot be empty")
+
+    if field_type is str:
+        if not isinstance(value, str):
+            raise ValueError(f"Policy setting {key} must be a string, got {value!r}")
+        return value
+
+    if field_type is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in TRUE_STRINGS:
+            return True
+        if isinstance(value, str) and value.strip().lower() in FALSE_STRINGS:
+            return False
+        raise ValueError(f"Policy setting {key} must be true/false, got {value!r}")
+
+    # int/float; bool is an int subclass but never a sensible number here
+    if isinstance(value, str):
+        try:
+            return field_type(value.strip())
+        except ValueError:
+            raise ValueError(f"Policy setting {key} must be a number, got {value!r}") from None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if field_type is int and value != int(value):
+            raise ValueError(f"Policy setting {key} must be a whole number, got {value!r}")
+        return field_type(value)
+    raise ValueError(f"Policy setting {key} must be a number, got {value!r}")
+
+
+def policy_from_dict(values: Dict, base: Optional[IdlePolicy] = None) -> IdlePolicy:
+    """
+    Build a policy by overriding `base` (defaults if None) with a dict of
+    (possibly string) values, e.g. parsed CLI/JSON
+    """
+    types = {f.name: f.type for f in fields(IdlePolicy)}
+    kwargs = {}
+
+    for key, value in values.items():
+        if key not in types:
+            raise ValueError(f"Unknown policy setting: {key}")
+        kwargs[key] = coerce_setting(key, value, types[key])
+
+    return replace(base or IdlePolicy(), **kwargs)
+
+
+def reading_is_active(policy: IdlePolicy, details: Dict) -> bool:
+    """
+    Decide if a single probe reading (the `details` the daemon logs) is active.
+    Missing fields (older log records) are treated as no activity.
+    """
+    if details.get('cpu_usage', 0.0) > policy.cpu_idle_threshold:
+        return True
+
+    if details.get('x11_idle_ms', 999999999) < policy.x11_idle_seconds * 1000:
+        return True
+
+    if policy.count_ssh_sessions and details.get('ssh_sessions', 0) > 0:
+        return True
+
+    if policy.count_modified_files and details.get('modified_files', 0) > 0:
+        return True
+
+    if policy.count_git_events and details.get('git_events'):
+        return True
+
+    if policy.count_active_processes and details.get('active_processes'):
+        return True
+
+    if policy.count_keyboard and details.get('keyboard_active', False):
+        return True
+
+    if policy.net_bytes_threshold is not None:
+        net_bytes = details.get('net_sent_bytes', 0) + details.get('net_recv_bytes', 0)
+        if net_bytes > policy.net_bytes_threshold:
+            return True
+
+    return False
+
+
+class IdleTimer:
+    """Tracks continuous idle time and says when the shutdown threshold is reached"""
+
+    def __init__(self, policy: IdlePolicy, start_time: float):
+        self.policy = policy
+        self.last_active_time = start_time
+
+    def observe(self, timestamp: float, is_active: bool) -> bool:
+        """Feed one check result; returns True when the VM should shut down"""
+        if is_active:
+            self.last_active_time = timestamp
+            return False
+        return self.idle_seconds(timestamp) >= self.policy.idle_shutdown_minutes * 60
+
+    def idle_seconds(self, timestamp: float) -> float:
+        """Seconds since the last active check"""
+        return max(0.0, timestamp - self.last_active_time)
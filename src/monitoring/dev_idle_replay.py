@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Idle Shutdown Policy Replay
+Replays recorded probe readings (or archived activity logs) through candidate
+idle policies and compares VM-hours saved against false shutdowns
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+from dev_idle_policy import IdlePolicy, IdleTimer, policy_from_dict, reading_is_active
+
+# Defaults mirror the daemon's configuration
+CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL_SECONDS', '5'))
+IDLE_SHUTDOWN_MINUTES = int(os.getenv('IDLE_SHUTDOWN_MINUTES', '30'))
+CPU_IDLE_THRESHOLD = float(os.getenv('CPU_IDLE_THRESHOLD', '5.0'))
+
+SESSION_START_EVENTS = {'daemon_start'}
+SESSION_END_EVENTS = {'auto_shutdown', 'daemon_stop'}
+READING_EVENTS = {'probe_reading', 'activity_detected'}
+
+# Policy settings the daemon logs in `daemon_start`, used as each session's `current` baseline
+RECORDED_SETTINGS = ('idle_shutdown_minutes', 'cpu_idle_threshold')
+
+# Recorded readings further apart than this are a VM-off gap, not idle time
+VM_OFF_GAP_CHECKS = 10
+VM_OFF_GAP_MIN_SECONDS = 300
+
+
+def parse_timestamp(value: str) -> float:
+    """Parse a log timestamp (naive values are UTC, as written by the daemon)"""
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def iter_log_files(paths: List[str]) -> List[Path]:
+    """Expand files and directories into a list of JSONL log files"""
+    log_files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            log_files.extend(sorted(path.rglob('*.jsonl')))
+            log_files.extend(sorted(path.rglob('*.jsonl.gz')))
+        elif path.exists():
+            log_files.append(path)
+        else:
+            print(f"Log path not found: {path}", file=sys.stderr)
+    return log_files
+
+
+def load_events(paths: List[str]) -> Dict[str, List[Dict]]:
+    """Load activity/readings events grouped by user and sorted by time"""
+    events_by_user = {}
+
+    for log_file in iter_log_files(paths):
+        opener = gzip.open if log_file.suffix == '.gz' else open
+        try:
+            with opener(log_file, 'rt') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                        event['ts'] = parse_timestamp(event['timestamp'])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    events_by_user.setdefault(event.get('user', 'unknown'), []).append(event)
+        except OSError as e:
+            print(f"Error reading {log_file}: {e}", file=sys.stderr)
+
+    for events in events_by_user.values():
+        events.sort(key=lambda e: e['ts'])
+
+    return events_by_user
+
+
+def vm_off_gap(interval: float) -> float:
+    """Gap between recorded readings beyond which the VM is assumed to have been off"""
+    return max(VM_OFF_GAP_CHECKS * interval, VM_OFF_GAP_MIN_SECONDS)
+
+
+def finish_session(raw: Dict, end: Optional[float]) -> List[Dict]:
+    """
+    Turn an open session into replayable sessions. Sessions with raw probe
+    readings use them as-is, split wherever a gap means the VM was off;
+    otherwise archived `activity_detected` events are used with the gaps
+    filled as idle checks, since the daemon only logs active checks.
+    With no stop event (crash, reboot, manual VM stop) a session ends one
+    interval after its last reading.
+    """
+    interval = raw['interval']
+    recorded = bool(raw['probe_reading'])
+    readings = raw['probe_reading'] or raw['activity_detected']
+
+    if not readings:
+        # Start/stop markers only - an idle run, unless we never saw it end
+        if end is None:
+            return []
+        return [{'start': raw['start'], 'end': end, 'interval': interval, 'settings': raw['settings'],
+                 'recorded': False, 'readings': [], 'checks': []}]
+
+    chunks = [[readings[0]]]
+    for reading in readings[1:]:
+        if recorded and reading[0] - chunks[-1][-1][0] > vm_off_gap(interval):
+            chunks.append([])
+        chunks[-1].append(reading)
+
+    sessions = []
+    for i, chunk in enumerate(chunks):
+        chunk_end = chunk[-1][0] + interval
+        if i == len(chunks) - 1 and end is not None:
+            chunk_end = max(end, chunk[-1][0])
+        session = {
+            'start': raw['start'] if i == 0 else chunk[0][0],
+            'end': chunk_end,
+            'interval': interval,
+            'settings': raw['settings'],
+            'recorded': recorded,
+            'readings': chunk
+        }
+        session['checks'] = chunk if recorded else fill_idle_gaps(session)
+        sessions.append(session)
+
+    return sessions
+
+
+def build_sessions(events: List[Dict], default_interval: int) -> List[Dict]:
+    """
+    Split a user's events into VM sessions (daemon start -> shutdown/stop).
+    Each session picks its own reading type, so history from before the
+    recorder was enabled is replayed alongside recorded sessions.
+    """
+    sessions = []
+    raw = None
+
+    def new_session(ts: float, details: Dict) -> Dict:
+        return {
+            'start': ts,
+            'interval': details.get('check_interval', default_interval),
+            'settings': {k: details[k] for k in RECORDED_SETTINGS if k in details},
+            'probe_reading': [],
+            'activity_detected': []
+        }
+
+    for event in events:
+        event_type = event['event_type']
+        details = event.get('details') or {}
+
+        if event_type in SESSION_START_EVENTS:
+            # The activity and readings logs both mark each start
+            if (raw and not raw['probe_reading'] and not raw['activity_detected']
+                    and event['ts'] - raw['start'] <= raw['interval']):
+                continue
+            if raw:
+                sessions.extend(finish_session(raw, None))
+            raw = new_session(event['ts'], details)
+        elif event_type in SESSION_END_EVENTS:
+            if raw:
+                sessions.extend(finish_session(raw, event['ts']))
+            raw = None
+        elif event_type in READING_EVENTS:
+            if raw is None:
+                raw = new_session(event['ts'], {})
+            raw[event_type].append((event['ts'], details))
+
+    if raw:
+        sessions.extend(finish_session(raw, None))
+
+    return sessions
+
+
+def fill_idle_gaps(session: Dict) -> List[tuple]:
+    """Expand a session's readings into one (timestamp, details|None) entry per check"""
+    interval = session['interval']
+    checks = []
+    previous = session['start']
+
+    for ts, details in session['readings'] + [(session['end'], None)]:
+        t = previous + interval
+        while t < ts - interval / 2:
+            checks.append((t, None))
+            t += interval
+        if details is not None:
+            checks.append((ts, details))
+        previous = ts
+
+    return checks
+
+
+def reading_is_engaged(details: Optional[Dict]) -> bool:
+    """Ground truth for false shutdowns: the engineer is physically working"""
+    if not details:
+        return False
+    return bool(
+        details.get('user_active_physically') or
+        details.get('keyboard_active') or
+        details.get('modified_files', 0) > 0 or
+        details.get('git_events')
+    )
+
+
+def simulate_session(policy: IdlePolicy, session: Dict, false_window_minutes: float) -> Dict:
+    """
+    Run one session through a policy. After a simulated shutdown the VM stays
+    off until the engineer is next engaged, when it is assumed to be restarted.
+    A shutdown followed by engagement within the window is a false shutdown.
+    """
+    timer = IdleTimer(policy, session['start'])
+    running = True
+    run_start = session['start']
+    shutdown_time = 0.0
+    result = {'vm_seconds': 0.0, 'shutdowns': 0, 'false_shutdowns': 0}
+
+    for ts, details in session['checks']:
+        if running:
+            is_active = details is not None and reading_is_active(policy, details)
+            if timer.observe(ts, is_active):
+                result['vm_seconds'] += ts - run_start
+                result['shutdowns'] += 1
+                running = False
+                shutdown_time = ts
+        elif reading_is_engaged(details):
+            if ts - shutdown_time <= false_window_minutes * 60:
+                result['false_shutdowns'] += 1
+            running = True
+            run_start = ts
+            timer = IdleTimer(policy, ts)
+
+    if running:
+        result['vm_seconds'] += session['end'] - run_start
+
+    return result
+
+
+def replay(candidates: List[Dict], sessions: List[Dict], false_window_minutes: float,
+           current: IdlePolicy) -> List[Dict]:
+    """
+    Replay all sessions through every candidate and summarize each. Candidates
+    are overrides of `current`, which takes each session's recorded idle
+    timeout and CPU threshold (falling back to `current`'s own values) and
+    its recorded check interval as the X11 window (as the daemon does), so a
+    candidate differs from what the VM ran only in the settings it names.
+    """
+    recorded_seconds = sum(s['end'] - s['start'] for s in sessions)
+    results = []
+
+    for candidate in candidates:
+        totals = {'vm_seconds': 0.0, 'shutdowns': 0, 'false_shutdowns': 0}
+        for session in sessions:
+            base = replace(current, x11_idle_seconds=session['interval'], **session['settings'])
+            policy = policy_from_dict(candidate, base)
+            for key, value in simulate_session(policy, session, false_window_minutes).items():
+                totals[key] += value
+
+        saved_seconds = recorded_seconds - totals['vm_seconds']
+        results.append({
+            'policy': candidate.get('name', current.name),
+            'overrides': {k: getattr(policy, k) for k in candidate if k != 'name'} if sessions else {},
+            'vm_hours': round(totals['vm_seconds'] / 3600, 2),
+            'hours_saved': round(saved_seconds / 3600, 2),
+            'percent_saved': round(100 * saved_seconds / recorded_seconds, 1) if recorded_seconds else 0.0,
+            'shutdowns': totals['shutdowns'],
+            'false_shutdowns': totals['false_shutdowns']
+        })
+
+    return results
+
+
+def parse_policy_spec(spec: str, index: int) -> Dict:
+    """Parse 'name:key=value,key=value' (the name is optional) into candidate overrides"""
+    name, _, settings = spec.rpartition(':') if ':' in spec else ('', '', spec)
+    values = {'name': name or f'candidate-{index}'}
+    for item in filter(None, settings.split(',')):
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"Expected key=value in policy spec: {item}")
+        values[key.strip()] = value
+    return values
+
+
+def print_summary(results: List[Dict], sessions: List[Dict], elapsed: float) -> None:
+    """Print a side-by-side comparison of the replayed policies"""
+    recorded_hours = sum(s['end'] - s['start'] for s in sessions) / 3600
+    span_days = (max(s['end'] for s in sessions) - min(s['start'] for s in sessions)) / 86400
+
+    print("\n" + "="*78)
+    print(f"Idle Policy Replay - {len(sessions)} sessions over {span_days:.1f} days "
+          f"(replayed in {elapsed:.2f}s)")
+    print(f"Recorded VM-hours: {recorded_hours:.2f}")
+    print("="*78)
+    print(f"{'Policy':<24}{'VM-hours':>10}{'Saved':>10}{'Saved %':>10}"
+          f"{'Shutdowns':>12}{'False':>8}")
+    print("-"*78)
+
+    for r in results:
+        print(f"{r['policy']:<24}{r['vm_hours']:>10.2f}{r['hours_saved']:>10.2f}"
+              f"{r['percent_saved']:>10.1f}{r['shutdowns']:>12}{r['false_shutdowns']:>8}")
+
+    print("="*78 + "\n")
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='+',
+                        help='Readings/activity JSONL files or directories (e.g. a GCS activity sync)')
+    parser.add_argument('--policy', action='append', default=[],
+                        help="Candidate policy 'name:key=value,...' (repeatable), "
+                             "e.g. 'strict:idle_shutdown_minutes=15,count_active_processes=false'")
+    parser.add_argument('--policies-file',
+                        help='JSON file with a list of candidate policy objects')
+    parser.add_argument('--user', help='Only replay this user')
+    parser.add_argument('--check-interval', type=int, default=CHECK_INTERVAL,
+                        help='Check interval when the logs do not record one (seconds)')
+    parser.add_argument('--false-shutdown-window', type=float, default=60.0,
+                        help='Engagement within this many minutes of a shutdown counts as false')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    current = IdlePolicy(
+        name='current',
+        idle_shutdown_minutes=IDLE_SHUTDOWN_MINUTES,
+        cpu_idle_threshold=CPU_IDLE_THRESHOLD,
+        x11_idle_seconds=args.check_interval
+    )
+    candidates = [{'name': current.name}]
+    try:
+        if args.policies_file:
+            with open(args.policies_file, 'r') as f:
+                for values in json.load(f):
+                    candidates.append(dict({'name': f'candidate-{len(candidates)}'}, **values))
+        for spec in args.policy:
+            candidates.append(parse_policy_spec(spec, len(candidates)))
+        for candidate in candidates:
+            policy_from_dict(candidate, current)  # Fail fast on unknown settings/values
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Invalid policy: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    started = time.time()
+    events_by_user = load_events(args.logs)
+    sessions = []
+    for user, events in events_by_user.items():
+        if args.user and user != args.user:
+            continue
+        sessions.extend(build_sessions(events, args.check_interval))
+
+    if not sessions:
+        print("No sessions found in logs", file=sys.stderr)
+        sys.exit(1)
+
+    results = replay(candidates, sessions, args.false_shutdown_window, current)
+    elapsed = time.time() - started
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_summary(results, sessions, elapsed)
+
+
+if __name__ == '__main__':
+    main()
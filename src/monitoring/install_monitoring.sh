@@ -161,6 +161,7 @@ Environment="ACTIVITY_LOG_DIR=$ACTIVITY_LOG_DIR"
 Environment="CHECK_INTERVAL_SECONDS=60"
 Environment="IDLE_SHUTDOWN_MINUTES=30"
 Environment="CPU_IDLE_THRESHOLD=5.0"
+Environment="RECORD_PROBE_READINGS=false"
 Environment="GCS_BUCKET=$GCS_BUCKET"
 ExecStart=/usr/bin/python3 $INSTALL_DIR/dev_activity_daemon.py
 Restart=always
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Monitoring scripts are deployed flat to /opt/dev-monitoring and import each other by name
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'src' / 'monitoring'))
@@ -0,0 +1,129 @@
+"""Tests for the activity daemon's git ref/reflog/index watcher"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip('psutil')
+if not shutil.which('git'):
+    pytest.skip('git not installed', allow_module_level=True)
+
+import dev_activity_daemon as daemon
+
+
+def git(repo, *args):
+    subprocess.run(
+        ['git', '-c', 'user.name=Dev', '-c', 'user.email=dev@example.com', '-c', 'gc.auto=0',
+         '-c', 'commit.gpgsign=false', '-c', 'init.defaultBranch=main', '-C', str(repo)] + list(args),
+        check=True, capture_output=True
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / 'projects' / 'app'
+    path.mkdir(parents=True)
+    git(path, 'init', '-q')
+    (path / 'main.py').write_text('print(1)\n')
+    git(path, 'add', 'main.py')
+    git(path, 'commit', '-qm', 'initial')
+    return path
+
+
+@pytest.fixture
+def scan(repo):
+    """Baseline the repo, then return a function reporting the kinds since the last scan"""
+    git_dir = str(repo / '.git')
+    state = {}
+    daemon.scan_git_dir(git_dir, state)
+    return lambda: daemon.scan_git_dir(git_dir, state)
+
+
+def test_status_and_index_refresh_are_not_activity(repo, scan):
+    os.utime(repo / 'main.py', (0, 0))
+    git(repo, 'status', '--porcelain')
+    git(repo, 'update-index', '--refresh')
+
+    assert scan() == {}
+
+
+def test_git_add_is_stage(repo, scan):
+    (repo / 'main.py').write_text('print(2)\n')
+    git(repo, 'add', 'main.py')
+
+    assert scan() == {'stage': 1}
+
+
+def test_commit_checkout_and_switch_kinds(repo, scan):
+    (repo / 'main.py').write_text('print(2)\n')
+    git(repo, 'commit', '-qam', 'change')
+    assert scan()['commit'] == 1  # commit -a also stages
+
+    git(repo, 'checkout', '-qb', 'feature')
+    assert scan()['checkout'] == 1
+
+    git(repo, 'switch', '-q', 'main')
+    assert scan() == {'checkout': 1}
+
+
+def test_fetch_kind(repo, tmp_path):
+    clone = tmp_path / 'projects' / 'clone'
+    git(tmp_path, 'clone', '-q', str(repo), str(clone))
+    git_dir, state = str(clone / '.git'), {}
+    daemon.scan_git_dir(git_dir, state)
+
+    (repo / 'main.py').write_text('print(2)\n')
+    git(repo, 'commit', '-qam', 'upstream change')
+    git(clone, 'fetch', '-q')
+
+    assert daemon.scan_git_dir(git_dir, state) == {'fetch': 1}
+
+
+def test_stash_kind(repo, scan):
+    (repo / 'main.py').write_text('print(2)\n')
+    git(repo, 'stash', '-q')
+
+    assert scan()['stash'] == 1
+
+
+def test_shrinking_reflog_is_ignored(repo, scan):
+    git(repo, 'commit', '-q', '--allow-empty', '-m', 'second')
+    scan()
+    git(repo, 'reflog', 'expire', '--expire=now', '--all')
+
+    assert scan() == {}
+
+
+def test_gc_packing_refs_is_ignored_but_branch_delete_is_not(repo, scan):
+    git(repo, 'branch', 'topic')
+    scan()
+    git(repo, 'gc', '-q')
+    assert scan() == {}
+
+    git(repo, 'branch', '-D', 'topic')
+    assert scan() == {'ref_update': 1}
+
+
+def test_linked_worktree_is_discovered(repo, tmp_path, monkeypatch):
+    git(repo, 'worktree', 'add', '-q', str(tmp_path / 'projects' / 'app-wt'))
+    monkeypatch.setattr(daemon, 'PROJECTS_ROOT', str(tmp_path / 'projects'))
+
+    repos = daemon.discover_git_repos()
+
+    assert sorted(repos.values()) == ['app', 'app-wt']
+    assert os.path.realpath(str(repo / '.git' / 'worktrees' / 'app-wt')) in repos
+
+
+@pytest.mark.parametrize('message, kind', [
+    ('commit (amend): fix typo', 'commit'),
+    ('checkout: moving from main to feature', 'checkout'),
+    ('switch: moving from feature to main', 'checkout'),
+    ('pull: Fast-forward', 'fetch'),
+    ('fetch: fast-forward', 'fetch'),
+    ('WIP on main: 1234567 initial', 'stash'),
+    ('update by push', 'push'),
+])
+def test_classify_reflog_message(message, kind):
+    assert daemon.classify_reflog_message(message) == kind
@@ -0,0 +1,163 @@
+"""Tests for the idle policy replay accounting"""
+
+import pytest
+
+from dev_idle_policy import IdlePolicy, policy_from_dict
+from dev_idle_replay import build_sessions, fill_idle_gaps, replay, simulate_session
+
+INTERVAL = 60
+ACTIVE = {'cpu_usage': 50.0, 'x11_idle_ms': 0, 'user_active_physically': True}
+IDLE = {'cpu_usage': 0.0, 'x11_idle_ms': 10 ** 9, 'user_active_physically': False}
+CURRENT = IdlePolicy(name='current', idle_shutdown_minutes=30, x11_idle_seconds=INTERVAL)
+
+
+def event(minute: float, event_type: str, details: dict = None) -> dict:
+    return {'ts': minute * 60, 'event_type': event_type, 'details': details or {}}
+
+
+def start(minute: float) -> dict:
+    return event(minute, 'daemon_start', {'check_interval': INTERVAL})
+
+
+def readings(first: int, last: int, details: dict, event_type: str = 'probe_reading') -> list:
+    return [event(m, event_type, details) for m in range(first, last)]
+
+
+def test_policy_from_dict_coerces_strings_and_keeps_base():
+    base = IdlePolicy(idle_shutdown_minutes=20, x11_idle_seconds=5)
+    policy = policy_from_dict({'name': 'x', 'count_active_processes': 'false',
+                               'cpu_idle_threshold': '12.5', 'net_bytes_threshold': '1000'}, base)
+
+    assert policy.name == 'x'
+    assert policy.count_active_processes is False
+    assert policy.cpu_idle_threshold == 12.5
+    assert policy.net_bytes_threshold == 1000
+    assert policy.idle_shutdown_minutes == 20
+    assert policy.x11_idle_seconds == 5
+
+
+def test_policy_from_dict_rejects_unknown_setting():
+    with pytest.raises(ValueError):
+        policy_from_dict({'idle_minutes': 10})
+
+
+@pytest.mark.parametrize('values', [
+    {'count_git_events': 'ture'},
+    {'count_git_events': 1},
+    {'idle_shutdown_minutes': [15]},
+    {'idle_shutdown_minutes': 'soon'},
+    {'idle_shutdown_minutes': None},
+    {'cpu_idle_threshold': True},
+    {'net_bytes_threshold': 1.5},
+    {'name': 3},
+])
+def test_policy_from_dict_rejects_bad_values(values):
+    with pytest.raises(ValueError):
+        policy_from_dict(values)
+
+
+def test_policy_from_dict_accepts_json_values():
+    policy = policy_from_dict({'idle_shutdown_minutes': 15, 'count_keyboard': True, 'net_bytes_threshold': None})
+
+    assert policy.idle_shutdown_minutes == 15.0 and isinstance(policy.idle_shutdown_minutes, float)
+    assert policy.count_keyboard is True
+    assert policy.net_bytes_threshold is None
+
+
+def test_current_policy_replaying_its_own_readings_saves_nothing():
+    # 10 active minutes, idle until the recorded daemon shut down at 30 idle minutes
+    events = ([start(0)] + readings(0, 10, ACTIVE) + readings(10, 40, IDLE) +
+              [event(39, 'auto_shutdown')] + [start(120)] + readings(120, 180, ACTIVE))
+    sessions = build_sessions(events, INTERVAL)
+
+    [result] = replay([{'name': 'current'}], sessions, 60, CURRENT)
+
+    assert len(sessions) == 2
+    assert result['hours_saved'] == pytest.approx(0, abs=0.02)
+    assert result['shutdowns'] == 1
+
+
+def test_current_policy_uses_the_settings_the_session_recorded():
+    # Recorded under a 60 minute timeout; the replay machine defaults to 30
+    recorded = event(0, 'daemon_start', {'check_interval': INTERVAL, 'idle_shutdown_minutes': 60,
+                                         'cpu_idle_threshold': 80.0})
+    busy = {'cpu_usage': 50.0, 'x11_idle_ms': 10 ** 9}
+    events = [recorded] + readings(0, 10, ACTIVE) + readings(10, 70, busy) + [event(69, 'auto_shutdown')]
+    sessions = build_sessions(events, INTERVAL)
+
+    current, candidate = replay([{'name': 'current'}, {'name': 'fast', 'idle_shutdown_minutes': 30}],
+                                sessions, 60, CURRENT)
+
+    # 50% CPU is idle under the recorded 80% threshold, so only the timeout differs
+    assert current['hours_saved'] == pytest.approx(0, abs=0.02)
+    assert current['shutdowns'] == 1
+    assert candidate['hours_saved'] == pytest.approx(0.5, abs=0.02)
+
+
+def test_gaps_between_activity_events_are_filled_with_idle_checks():
+    events = [start(0)] + readings(0, 2, ACTIVE, 'activity_detected') + \
+        [event(10, 'activity_detected', ACTIVE), event(12, 'daemon_stop')]
+    [session] = build_sessions(events, INTERVAL)
+
+    checks = fill_idle_gaps(session)
+
+    assert not session['recorded']
+    assert [c[0] / 60 for c in checks] == list(range(0, 12))
+    assert [c[0] / 60 for c in checks if c[1] is None] == [2, 3, 4, 5, 6, 7, 8, 9, 11]
+
+
+def test_false_shutdown_counted_only_within_window():
+    policy = IdlePolicy(idle_shutdown_minutes=10, x11_idle_seconds=INTERVAL)
+    # Last active check at minute 4, so shut down at 14; engineer returns at 40 (26 minutes later)
+    events = [start(0)] + readings(0, 5, ACTIVE) + readings(5, 40, IDLE) + readings(40, 45, ACTIVE)
+    [session] = build_sessions(events, INTERVAL)
+
+    within = simulate_session(policy, session, false_window_minutes=30)
+    outside = simulate_session(policy, session, false_window_minutes=20)
+
+    assert within['shutdowns'] == outside['shutdowns'] == 1
+    assert within['false_shutdowns'] == 1
+    assert outside['false_shutdowns'] == 0
+    # Running 0-14 and again from the return at 40 until the session end at 45
+    assert within['vm_seconds'] == (14 + 5) * 60
+
+
+def test_session_without_stop_event_ends_after_its_last_reading():
+    # VM stopped manually (no daemon_stop), next boot the following day
+    events = [start(0)] + readings(0, 60, ACTIVE) + [start(24 * 60)] + readings(24 * 60, 24 * 60 + 60, ACTIVE)
+    sessions = build_sessions(events, INTERVAL)
+
+    [result] = replay([{'name': 'current'}], sessions, 60, CURRENT)
+
+    assert [(s['start'] / 60, s['end'] / 60) for s in sessions] == [(0, 60), (24 * 60, 24 * 60 + 60)]
+    assert result['vm_hours'] == 2
+    assert result['hours_saved'] == 0
+
+
+def test_recorded_gap_far_longer_than_a_check_means_vm_off():
+    events = [start(0)] + readings(0, 30, ACTIVE) + readings(300, 330, ACTIVE)
+    sessions = build_sessions(events, INTERVAL)
+
+    assert [(s['start'] / 60, s['end'] / 60) for s in sessions] == [(0, 30), (300, 330)]
+
+
+def test_reading_type_is_chosen_per_session():
+    events = ([start(0)] + readings(0, 10, ACTIVE, 'activity_detected') + [event(20, 'daemon_stop')] +
+              [start(60)] + readings(60, 70, ACTIVE) + readings(60, 70, ACTIVE, 'activity_detected'))
+    sessions = build_sessions(events, INTERVAL)
+
+    assert [s['recorded'] for s in sessions] == [False, True]
+
+
+def test_candidates_only_change_the_settings_they_name():
+    fast_checks = IdlePolicy(name='current', idle_shutdown_minutes=20, x11_idle_seconds=INTERVAL)
+    events = [event(0, 'daemon_start', {'check_interval': 5})] + \
+        [event(m / 12, 'probe_reading', {'x11_idle_ms': 30 * 1000}) for m in range(12 * 25)]
+    sessions = build_sessions(events, INTERVAL)
+
+    current, candidate = replay([{'name': 'current'}, {'name': 'np', 'count_active_processes': 'false'}],
+                                sessions, 60, fast_checks)
+
+    # Input 30s ago is idle at a 5s check interval, for both policies
+    assert current['shutdowns'] == candidate['shutdowns'] == 1
+    assert candidate['overrides'] == {'count_active_processes': False}